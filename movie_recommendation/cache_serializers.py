@@ -0,0 +1,19 @@
+import orjson
+from django.core.serializers.json import DjangoJSONEncoder
+from django_redis.serializers.base import BaseSerializer
+
+
+class ORJSONSerializer(BaseSerializer):
+    """
+    django-redis serializer storing values as JSON via orjson
+    Smaller and faster than the default pickle for the JSON-shaped TMDb payloads we cache
+    """
+
+    _encoder = DjangoJSONEncoder()
+
+    def dumps(self, value):
+        # Fall back to Django's encoder for types orjson doesn't know (Decimal, lazy strings, ...)
+        return orjson.dumps(value, default=self._encoder.default)
+
+    def loads(self, value):
+        return orjson.loads(value)
@@ -1,5 +1,6 @@
 import logging
 import os
+import reprlib
 
 from celery import Celery
 from celery.signals import task_failure, task_postrun, task_prerun
@@ -18,12 +19,15 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 # Define Queues and Exchanges for RabbitMQ
 task_exchange = Exchange("tasks", type="topic", durable=True)
 
+# RabbitMQ only honours message priorities on queues declared with x-max-priority
+priority_queue_arguments = {"x-max-priority": 10}
+
 app.conf.task_queues = (
-    Queue("default", exchange=task_exchange, routing_key="task.default", priority=5),
-    Queue("emails", exchange=task_exchange, routing_key="task.emails", priority=10),
-    Queue("cache", exchange=task_exchange, routing_key="task.cache", priority=7),
-    Queue("api", exchange=task_exchange, routing_key="task.api", priority=6),
-    Queue("reports", exchange=task_exchange, routing_key="task.reports", priority=4),
+    Queue("default", exchange=task_exchange, routing_key="task.default", queue_arguments=priority_queue_arguments),
+    Queue("emails", exchange=task_exchange, routing_key="task.emails", queue_arguments=priority_queue_arguments),
+    Queue("cache", exchange=task_exchange, routing_key="task.cache", queue_arguments=priority_queue_arguments),
+    Queue("api", exchange=task_exchange, routing_key="task.api", queue_arguments=priority_queue_arguments),
+    Queue("reports", exchange=task_exchange, routing_key="task.reports", queue_arguments=priority_queue_arguments),
 )
 
 app.conf.task_default_queue = "default"
@@ -38,13 +42,21 @@ app.autodiscover_tasks()
 @task_prerun.connect
 def task_prerun_handler(sender=None, task_id=None, task=None, args=None, kwargs=None, **extra):
     """Log when task starts"""
-    logger.info("Task %s[%s] started with args=%s, kwargs=%s", task.name, task_id, args, kwargs)
+    if logger.isEnabledFor(logging.DEBUG):
+        # Payloads can be large (e.g. movie detail dicts), so only log a truncated repr
+        logger.debug(
+            "Task %s[%s] started with args=%s, kwargs=%s",
+            task.name,
+            task_id,
+            reprlib.repr(args),
+            reprlib.repr(kwargs),
+        )
 
 
 @task_postrun.connect
 def task_postrun_handler(sender=None, task_id=None, task=None, args=None, kwargs=None, retval=None, **extra):
     """Log when task completes"""
-    logger.info("Task %s[%s] completed successfully", task.name, task_id)
+    logger.debug("Task %s[%s] completed successfully", task.name, task_id)
 
 
 @task_failure.connect
@@ -0,0 +1,71 @@
+import copy
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class _RotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that creates the log directory when the file is first opened"""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class QueuedRotatingFileHandler(QueueHandler):
+    """
+    RotatingFileHandler whose record layout and disk writes run on a background
+    QueueListener thread; the request/worker thread only builds the message
+    string and enqueues the record.
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding=None):
+        super().__init__(queue.SimpleQueue())
+        self.file_handler = _RotatingFileHandler(
+            filename,
+            maxBytes=maxBytes,
+            backupCount=backupCount,
+            encoding=encoding,
+            delay=True,
+        )
+        self.listener = None
+        self._start_listener()
+
+        # The listener thread does not survive fork (gunicorn/Celery prefork children)
+        os.register_at_fork(after_in_child=self._start_listener)
+
+    def _start_listener(self):
+        """Start a fresh listener thread draining a fresh queue into the file handler"""
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue, self.file_handler)
+        self.listener.start()
+
+    def prepare(self, record):
+        """
+        Enqueue a copy of the record whose message is already built, leaving only the layout
+        (timestamp, level, ...) to the formatter on the listener thread
+        """
+        record = copy.copy(record)
+        # Interpolate args now: they may be mutated later, and lazy objects or model __str__
+        # can hit the ORM, which the listener thread has no connection for
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Render tracebacks now rather than handing live frames to another thread
+            formatter = self.file_handler.formatter or logging.Formatter()
+            record.exc_text = formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def setFormatter(self, fmt):
+        """Apply the record layout on the listener thread instead of the calling thread"""
+        self.file_handler.setFormatter(fmt)
+
+    def close(self):
+        """Flush pending records to disk before closing"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.file_handler.close()
+        super().close()
@@ -9,10 +9,11 @@ from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
+# Created on first write by the log handlers (and at build time by render-build.sh)
 LOG_DIR = os.path.join(BASE_DIR, "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
-os.environ["SSL_CERT_FILE"] = certifi.where()
-os.environ["REQUESTS_CA_BUNDLE"] = certifi.where()
+CA_BUNDLE = certifi.where()
+os.environ["SSL_CERT_FILE"] = CA_BUNDLE
+os.environ["REQUESTS_CA_BUNDLE"] = CA_BUNDLE
 
 
 SECRET_KEY = config("SECRET_KEY")
@@ -81,7 +82,13 @@ WSGI_APPLICATION = "movie_recommendation.wsgi.application"
 IS_RENDER = config("RENDER", default=None)
 
 if IS_RENDER:
-    DATABASES = {"default": dj_database_url.config(default=config("DATABASE_URL"), conn_max_age=600)}
+    DATABASES = {
+        "default": dj_database_url.config(
+            default=config("DATABASE_URL"),
+            conn_max_age=600,
+            conn_health_checks=True,
+        )
+    }
 else:
     DATABASES = {
         "default": {
@@ -91,6 +98,11 @@ else:
             "PASSWORD": config("DATABASE_PASSWORD"),
             "HOST": config("DATABASE_HOST"),
             "PORT": config("DATABASE_PORT"),
+            # Reuse connections across requests instead of reconnecting each time
+            "CONN_MAX_AGE": 600,
+            "CONN_HEALTH_CHECKS": True,
+            # Keep named cursors so QuerySet.iterator() streams rows from PostgreSQL
+            "DISABLE_SERVER_SIDE_CURSORS": False,
         }
     }
 
@@ -99,6 +111,21 @@ REDIS_URL = config("UPSTASH_REDIS_URL", default=None)
 if not REDIS_URL:
     raise Exception("UPSTASH_REDIS_URL is not set in environment")
 
+# Shared django-redis options: a sized connection pool, bounded socket timeouts,
+# and treating Redis as a best-effort cache so an outage doesn't fail requests.
+# redis-py parses replies with hiredis (C parser) automatically when it is installed.
+REDIS_CACHE_OPTIONS = {
+    "CONNECTION_POOL_KWARGS": {"max_connections": 100, "retry_on_timeout": True},
+    "SOCKET_CONNECT_TIMEOUT": 5,
+    "SOCKET_TIMEOUT": 5,
+    "IGNORE_EXCEPTIONS": True,
+    # Movie payloads are multi-KB JSON-like dicts; compress them to cut Upstash bandwidth
+    "COMPRESSOR": "django_redis.compressors.zlib.ZlibCompressor",
+    "SERIALIZER": "movie_recommendation.cache_serializers.ORJSONSerializer",
+}
+DJANGO_REDIS_IGNORE_EXCEPTIONS = True
+DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS = True
+
 if IS_RENDER and REDIS_URL:
     # Render / Production: Upstash with SSL
     CELERY_RESULT_BACKEND = REDIS_URL
@@ -109,15 +136,18 @@ if IS_RENDER and REDIS_URL:
             "OPTIONS": {
                 "CLIENT_CLASS": "django_redis.client.DefaultClient",
                 "SSL_CERT_REQS": ssl.CERT_REQUIRED,
-                "SSL_CA_CERTS": certifi.where(),
+                "SSL_CA_CERTS": CA_BUNDLE,
+                **REDIS_CACHE_OPTIONS,
             },
             "KEY_PREFIX": "movie_app",
+            # Bumped when the stored value format changes (orjson, trimmed TMDb payloads) so stale entries are never read
+            "VERSION": 3,
             "TIMEOUT": 3600,
         }
     }
     CELERY_REDIS_BACKEND_USE_SSL = {
         "ssl_cert_reqs": ssl.CERT_REQUIRED,
-        "ssl_ca_certs": certifi.where(),
+        "ssl_ca_certs": CA_BUNDLE,
     }
 else:
     # Local development: plain Redis on localhost
@@ -129,8 +159,11 @@ else:
             "LOCATION": REDIS_URL,
             "OPTIONS": {
                 "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                **REDIS_CACHE_OPTIONS,
             },
             "KEY_PREFIX": "movie_app",
+            # Bumped when the stored value format changes (orjson, trimmed TMDb payloads) so stale entries are never read
+            "VERSION": 3,
             "TIMEOUT": 3600,
         }
     }
@@ -148,16 +181,29 @@ CELERY_BROKER_URL = config(
     default=f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASSWORD}@{RABBITMQ_HOST}:{RABBITMQ_PORT}/{RABBITMQ_VHOST}",
 )
 
-CELERY_ACCEPT_CONTENT = ["application/json"]
-CELERY_TASK_SERIALIZER = "json"
-CELERY_RESULT_SERIALIZER = "json"
+# msgpack is a compact binary format; json stays accepted for messages already in flight
+CELERY_ACCEPT_CONTENT = ["msgpack", "json"]
+CELERY_TASK_SERIALIZER = "msgpack"
+CELERY_RESULT_SERIALIZER = "msgpack"
+CELERY_RESULT_COMPRESSION = "gzip"
 CELERY_TIMEZONE = "UTC"
 CELERY_TASK_TRACK_STARTED = True
+# Task return values are not read anywhere; opt in per task with ignore_result=False
+CELERY_TASK_IGNORE_RESULT = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes
 CELERY_TASK_ACKS_LATE = True
-CELERY_WORKER_PREFETCH_MULTIPLIER = 1
-CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
+# Tasks are I/O-bound (TMDb HTTP, SMTP), so let each process reserve a few messages.
+# Long-running report tasks should be consumed by a dedicated worker started with
+# `-Q reports -O fair --prefetch-multiplier=1 --max-tasks-per-child=50`.
+CELERY_WORKER_PREFETCH_MULTIPLIER = config("CELERY_WORKER_PREFETCH_MULTIPLIER", default=4, cast=int)
+CELERY_WORKER_MAX_TASKS_PER_CHILD = config("CELERY_WORKER_MAX_TASKS_PER_CHILD", default=1000, cast=int)
+# Recycle a prefork child once its resident memory exceeds this many KiB (~200 MB)
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = config("CELERY_WORKER_MAX_MEMORY_PER_CHILD", default=200_000, cast=int)
+# Keep Django's LOGGING configuration instead of letting the worker reconfigure the root logger
+CELERY_WORKER_HIJACK_ROOT_LOGGER = False
+# Only publish task events when a monitor such as Flower is attached
+CELERY_WORKER_SEND_TASK_EVENTS = config("CELERY_WORKER_SEND_TASK_EVENTS", default=False, cast=bool)
 
 # RabbitMQ Specific Configuration
 CELERY_BROKER_CONNECTION_RETRY = True
@@ -232,10 +278,9 @@ TMDB_BASE_URL = config("TMDB_BASE_URL")
 
 # REST Framework configuration
 REST_FRAMEWORK = {
-    "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
-        "rest_framework.renderers.BrowsableAPIRenderer",
-    ],
+    # The HTML browsable API is a development aid; production clients only get JSON
+    "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"]
+    + (["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework_simplejwt.authentication.JWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
@@ -313,32 +358,32 @@ LOGGING = {
         },
         "file": {
             "level": "INFO",
-            "class": "logging.handlers.RotatingFileHandler",
-            "filename": os.path.join(BASE_DIR, "logs", "app.log"),
+            "class": "movie_recommendation.logging_handlers.QueuedRotatingFileHandler",
+            "filename": os.path.join(LOG_DIR, "app.log"),
             "maxBytes": 1024 * 1024 * 10,  # 10 MB
             "backupCount": 5,
             "formatter": "verbose",
         },
         "cache_file": {
             "level": "INFO",
-            "class": "logging.handlers.RotatingFileHandler",
-            "filename": os.path.join(BASE_DIR, "logs", "cache.log"),
+            "class": "movie_recommendation.logging_handlers.QueuedRotatingFileHandler",
+            "filename": os.path.join(LOG_DIR, "cache.log"),
             "maxBytes": 1024 * 1024 * 5,  # 5 MB
             "backupCount": 3,
             "formatter": "verbose",
         },
         "api_file": {
             "level": "INFO",
-            "class": "logging.handlers.RotatingFileHandler",
-            "filename": os.path.join(BASE_DIR, "logs", "api.log"),
+            "class": "movie_recommendation.logging_handlers.QueuedRotatingFileHandler",
+            "filename": os.path.join(LOG_DIR, "api.log"),
             "maxBytes": 1024 * 1024 * 10,  # 10 MB
             "backupCount": 5,
             "formatter": "verbose",
         },
         "celery_file": {
             "level": "INFO",
-            "class": "logging.handlers.RotatingFileHandler",
-            "filename": os.path.join(BASE_DIR, "logs", "celery.log"),
+            "class": "movie_recommendation.logging_handlers.QueuedRotatingFileHandler",
+            "filename": os.path.join(LOG_DIR, "celery.log"),
             "maxBytes": 1024 * 1024 * 10,  # 10 MB
             "backupCount": 5,
             "formatter": "verbose",
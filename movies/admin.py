@@ -1,10 +1,45 @@
+import json
+from functools import lru_cache
+
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Avg, Count
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.urls import reverse
-from django.utils.html import escape, format_html, format_html_join
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
 
 from .models import FavoriteMovie
 
+# Rating badge templates, prebuilt per color/icon so rows only interpolate the score
+_VOTE_BADGE = (
+    '<span style="background: {color}; color: white; padding: 3px 8px; border-radius: 12px; '
+    'font-weight: bold; font-size: 11px;">{icon} {{}}</span>'
+)
+_VOTE_BADGE_HIGH = _VOTE_BADGE.format(color="#4caf50", icon="★")  # Green
+_VOTE_BADGE_MEDIUM = _VOTE_BADGE.format(color="#ff9800", icon="★")  # Orange
+_VOTE_BADGE_LOW = _VOTE_BADGE.format(color="#f44336", icon="☆")  # Red
+
+_THUMBNAIL_HTML = (
+    '<img src="https://image.tmdb.org/t/p/w92{}" width="45" height="68" '
+    'style="border-radius: 4px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />'
+)
+_NO_IMAGE_HTML = mark_safe(
+    '<div style="width: 45px; height: 68px; background: #e0e0e0; border-radius: 4px; display: flex; '
+    'align-items: center; justify-content: center; font-size: 10px; color: #666;">No Image</div>'
+)
+
+# Keys of each exported favorite, matching the export format consumers already read
+_EXPORT_FIELDS = ("movie_id", "title", "user", "vote_average", "release_date", "added_at")
+
+
+@lru_cache(maxsize=1)
+def _user_change_url_template():
+    """Resolve the admin user change URL once and return it as a str.format template"""
+    return reverse("admin:auth_user_change", args=[0]).replace("/0/", "/{}/")
+
 
 @admin.register(FavoriteMovie)
 class FavoriteMovieAdmin(admin.ModelAdmin):
@@ -94,14 +129,8 @@ class FavoriteMovieAdmin(admin.ModelAdmin):
     def movie_thumbnail(self, obj):
         """Display small movie poster thumbnail"""
         if obj.poster_path:
-            img_url = f"https://image.tmdb.org/t/p/w92{obj.poster_path}"
-            return format_html(
-                '<img src="{}" width="45" height="68" style="border-radius: 4px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />',
-                img_url,
-            )
-        return format_html(
-            '<div style="width: 45px; height: 68px; background: #e0e0e0; border-radius: 4px; display: flex; align-items: center; justify-content: center; font-size: 10px; color: #666;">No Image</div>'
-        )
+            return format_html(_THUMBNAIL_HTML, obj.poster_path)
+        return _NO_IMAGE_HTML
 
     movie_thumbnail.short_description = "Poster"
 
@@ -119,7 +148,7 @@ class FavoriteMovieAdmin(admin.ModelAdmin):
 
     def user_link(self, obj):
         """Create clickable link to user's profile"""
-        url = reverse("admin:auth_user_change", args=[obj.user.id])
+        url = _user_change_url_template().format(obj.user_id)
         return format_html(
             '<a href="{}" style="color: #417690; text-decoration: none;">{}</a>',
             url,
@@ -132,21 +161,13 @@ class FavoriteMovieAdmin(admin.ModelAdmin):
     def vote_average_display(self, obj):
         """Display vote average with colored badge"""
         if obj.vote_average >= 8.0:
-            color = "#4caf50"  # Green
-            icon = "★"
+            template = _VOTE_BADGE_HIGH
         elif obj.vote_average >= 6.0:
-            color = "#ff9800"  # Orange
-            icon = "★"
+            template = _VOTE_BADGE_MEDIUM
         else:
-            color = "#f44336"  # Red
-            icon = "☆"
+            template = _VOTE_BADGE_LOW
 
-        return format_html(
-            '<span style="background: {}; color: white; padding: 3px 8px; border-radius: 12px; font-weight: bold; font-size: 11px;">{} {}</span>',
-            color,
-            icon,
-            obj.vote_average,
-        )
+        return format_html(template, obj.vote_average)
 
     vote_average_display.short_description = "Rating"
     vote_average_display.admin_order_field = "vote_average"
@@ -169,96 +190,52 @@ class FavoriteMovieAdmin(admin.ModelAdmin):
     view_on_tmdb.short_description = "TMDb Link"
 
     def movie_info_card(self, obj):
-        """Display comprehensive movie information card (XSS-safe)"""
-
-        info = {
-            "TMDb ID": obj.movie_id,
-            "Title": obj.title,
-            "Release Date": obj.release_date or "N/A",
-            "Vote Average": obj.vote_average,
-            "Overview": obj.overview or "No overview available",
-            "Poster Path": obj.poster_path or "N/A",
-            "Added By": obj.user.username,
-            "Added On": obj.added_at.strftime("%Y-%m-%d %H:%M:%S"),
-        }
-
-        # Card wrapper (static, safe)
-        opening_html = format_html(
-            """
-            <div style="
-                background: white;
-                padding: 20px;
-                border-radius: 12px;
-                max-width: 600px;
-                border-left: 4px solid #417690;
-                box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            ">
-                <h4 style="margin-top: 0; margin-bottom: 15px; color: #417690; 
-                        border-bottom: 1px solid #e9ecef; padding-bottom: 8px;">
-                    Movie Information Card
-                </h4>
-        """
-        )
-
-        # Securely build each info row
-        rows_html = format_html_join(
-            "",
-            """
-            <div style="
-                margin-bottom: 12px;
-                padding: 8px 0;
-                border-bottom: 1px solid #f8f9fa;
-            ">
-                <strong style="color: #495057; min-width: 120px; display: inline-block;">{}:</strong>
-                <span style="color: #212529;">{}</span>
-            </div>
-            """,
-            # Escape both key and value safely
-            ((escape(k), escape(v)) for k, v in info.items()),
-        )
-
-        closing_html = format_html("</div>")
-
-        return opening_html + rows_html + closing_html
+        """Display comprehensive movie information card (XSS-safe, template autoescapes values)"""
+        info = [
+            ("TMDb ID", obj.movie_id),
+            ("Title", obj.title),
+            ("Release Date", obj.release_date or "N/A"),
+            ("Vote Average", obj.vote_average),
+            ("Overview", obj.overview or "No overview available"),
+            ("Poster Path", obj.poster_path or "N/A"),
+            ("Added By", obj.user.username),
+            ("Added On", obj.added_at.strftime("%Y-%m-%d %H:%M:%S")),
+        ]
+
+        return render_to_string("admin/movies/movie_info_card.html", {"info": info})
 
     movie_info_card.short_description = "Complete Movie Information"
 
     def export_favorites(self, request, queryset):
-        """Export selected favorites as JSON"""
-        data = []
-        for favorite in queryset:
-            data.append(
-                {
-                    "movie_id": favorite.movie_id,
-                    "title": favorite.title,
-                    "user": favorite.user.username,
-                    "vote_average": favorite.vote_average,
-                    "release_date": favorite.release_date,
-                    "added_at": favorite.added_at.isoformat(),
-                }
-            )
-
-        self.message_user(request, f"Exported {len(data)} favorites successfully.")
+        """Export selected favorites as newline-delimited JSON, streamed in chunks"""
+        # values() can't alias user__username as "user" (it clashes with the field), so rows are zipped onto the keys
+        rows = queryset.values_list("movie_id", "title", "user__username", "vote_average", "release_date", "added_at")
+
+        response = StreamingHttpResponse(
+            (
+                json.dumps(dict(zip(_EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + "\n"
+                for row in rows.iterator(chunk_size=2000)
+            ),
+            content_type="application/x-ndjson",
+        )
+        response["Content-Disposition"] = 'attachment; filename="favorites.ndjson"'
+        return response
 
-    export_favorites.short_description = "Export selected favorites as JSON"
+    export_favorites.short_description = "Export selected favorites as NDJSON"
 
     def clear_cache_for_selected(self, request, queryset):
         """Clear Redis cache for selected movie IDs"""
-        from django.core.cache import cache
+        # Clear the default -added_at ordering so DISTINCT applies to movie_id alone
+        movie_ids = list(queryset.order_by().values_list("movie_id", flat=True).distinct())
 
-        movie_ids = queryset.values_list("movie_id", flat=True).distinct()
-
-        cleared_count = 0
-        for movie_id in movie_ids:
-            cache_keys = [f"movie_details_{movie_id}", f"recommended_movies_{movie_id}"]
-            for key in cache_keys:
-                cache.delete(key)
-                cleared_count += 1
+        # Delete all keys in a single round-trip instead of one DEL per key
+        cache_keys = [f"movie_details_{movie_id}" for movie_id in movie_ids]
+        cache_keys += [f"recommended_movies_{movie_id}" for movie_id in movie_ids]
+        cache.delete_many(cache_keys)
 
         self.message_user(
             request,
-            f"Cleared {cleared_count} cache entries for {len(movie_ids)} movies.",
+            f"Cleared {len(cache_keys)} cache entries for {len(movie_ids)} movies.",
         )
 
     clear_cache_for_selected.short_description = "Clear cache for selected movies"
@@ -268,25 +245,32 @@ class FavoriteMovieAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         return qs.select_related("user")
 
-    def changelist_view(self, request, extra_context=None):
-        """Add statistics to the admin list view"""
-        extra_context = extra_context or {}
-
-        # Calculate statistics
-        total_favorites = FavoriteMovie.objects.count()
-        unique_users = FavoriteMovie.objects.values("user").distinct().count()
-        unique_movies = FavoriteMovie.objects.values("movie_id").distinct().count()
-        avg_rating = FavoriteMovie.objects.aggregate(Avg("vote_average"))["vote_average__avg"]
+    def _get_changelist_stats(self):
+        """Compute favorites statistics in a single aggregate query plus the top 5 movies"""
+        stats = FavoriteMovie.objects.aggregate(
+            total_favorites=Count("id"),
+            unique_users=Count("user", distinct=True),
+            unique_movies=Count("movie_id", distinct=True),
+            avg_rating=Avg("vote_average"),
+        )
 
         # Top 5 most favorited movies
-        top_movies = (
+        stats["top_movies"] = list(
             FavoriteMovie.objects.values("movie_id", "title", "poster_path").annotate(count=Count("id")).order_by("-count")[:5]
         )
+        return stats
+
+    def changelist_view(self, request, extra_context=None):
+        """Add statistics to the admin list view (cached for 5 minutes)"""
+        extra_context = extra_context or {}
+
+        stats = cache.get_or_set("admin:favorite_stats", self._get_changelist_stats, 300)
+        avg_rating = stats["avg_rating"]
 
-        extra_context["total_favorites"] = total_favorites
-        extra_context["unique_users"] = unique_users
-        extra_context["unique_movies"] = unique_movies
+        extra_context["total_favorites"] = stats["total_favorites"]
+        extra_context["unique_users"] = stats["unique_users"]
+        extra_context["unique_movies"] = stats["unique_movies"]
         extra_context["avg_rating"] = round(avg_rating, 2) if avg_rating else 0
-        extra_context["top_movies"] = top_movies
+        extra_context["top_movies"] = stats["top_movies"]
 
         return super().changelist_view(request, extra_context)
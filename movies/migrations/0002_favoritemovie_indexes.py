@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-15 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="favoritemovie",
+            index=models.Index(fields=["-added_at"], name="fav_added_desc_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="favoritemovie",
+            index=models.Index(fields=["movie_id"], name="fav_movie_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="favoritemovie",
+            index=models.Index(fields=["user", "-added_at"], name="fav_user_added_idx"),
+        ),
+    ]
@@ -22,10 +22,15 @@ class FavoriteMovie(models.Model):
     added_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        """Ensure each user can favorite a movie only once and order by newest first."""
+        """Ensure each user can favorite a movie only once, order by newest first, and index common lookups."""
 
         unique_together = ("user", "movie_id")
         ordering = ["-added_at"]
+        indexes = [
+            models.Index(fields=["-added_at"], name="fav_added_desc_idx"),
+            models.Index(fields=["movie_id"], name="fav_movie_id_idx"),
+            models.Index(fields=["user", "-added_at"], name="fav_user_added_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.title}"
@@ -11,7 +11,7 @@ class MovieSerializer(serializers.Serializer):
     overview = serializers.CharField()
     poster_path = serializers.CharField(allow_null=True)
     backdrop_path = serializers.CharField(allow_null=True)
-    release_date = serializers.CharField()
+    release_date = serializers.DateField(input_formats=["%Y-%m-%d"], required=False)
     vote_average = serializers.FloatField()
     vote_count = serializers.IntegerField()
     popularity = serializers.FloatField()
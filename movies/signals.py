@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FavoriteMovie
+
+# Bumped whenever data behind the analytics report changes; the report cache key embeds it.
+# Stored without a TTL and exempt from cleanup_old_cache: restarting at 1 could match a still-cached report
+ANALYTICS_GENERATION_KEY = "analytics_generation"
+
+
+def bump_analytics_generation():
+    """Increment the analytics generation counter, creating it on first use"""
+    try:
+        cache.incr(ANALYTICS_GENERATION_KEY)
+    except ValueError:
+        cache.set(ANALYTICS_GENERATION_KEY, 1, timeout=None)
+
+
+@receiver(post_save, sender=FavoriteMovie)
+@receiver(post_delete, sender=FavoriteMovie)
+def favorite_changed(sender, **kwargs):
+    """Invalidate the analytics report when favorites change"""
+    bump_analytics_generation()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, update_fields=None, **kwargs):
+    """Invalidate the analytics report when a user is created or edited (not on the last_login save at login)"""
+    if update_fields is None or set(update_fields) != {"last_login"}:
+        bump_analytics_generation()
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, **kwargs):
+    """Invalidate the analytics report when a user is deleted"""
+    bump_analytics_generation()
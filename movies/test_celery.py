@@ -1,19 +1,41 @@
-from unittest.mock import patch
+import time
+from datetime import timedelta
+from unittest.mock import MagicMock, call, patch
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
-from .tasks import fetch_movie_details_async, refresh_trending_cache, send_favorite_notification
+from .models import FavoriteMovie
+from .signals import ANALYTICS_GENERATION_KEY
+from .tasks import (
+    BULK_CACHE_CHUNK_SIZE,
+    bulk_cache_popular_movies,
+    cleanup_old_cache,
+    fetch_movie_details_async,
+    generate_analytics_report,
+    refresh_trending_cache,
+    send_favorite_notification,
+    send_weekly_recommendations,
+)
+from .testing import locmem_caches
 
 User = get_user_model()
 
+
 # bandit: skip=B105,B106
+@override_settings(CACHES=locmem_caches("celery-task-tests"))
 class CeleryTaskTests(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username="testuser", email="test@example.com", password="tespass123")
 
-    @patch("movies.tasks.tmdb_service.get_trending_movies")
+    @patch("movies.tasks.tmdb_service.fetch_trending_movies")
     def test_refresh_trending_cache(self, mock_trending):
         mock_trending.return_value = {"results": []}
 
@@ -22,6 +44,15 @@ class CeleryTaskTests(TestCase):
         self.assertEqual(result["status"], "success")
         self.assertEqual(mock_trending.call_count, 3)
 
+    @patch("movies.tasks.tmdb_service.fetch_trending_movies")
+    def test_refresh_trending_cache_overwrites_live_pages(self, mock_trending):
+        cache.set("trending_movies_1", {"results": [{"id": 1}]}, 3600)
+        mock_trending.return_value = {"results": [{"id": 2}]}
+
+        refresh_trending_cache()
+
+        self.assertEqual(cache.get("trending_movies_1"), {"results": [{"id": 2}]})
+
     @patch("movies.tasks.send_mail")
     def test_send_favorite_notification(self, mock_mail):
         result = send_favorite_notification(user_id=self.user.id, movie_title="Test Movie")
@@ -37,3 +68,153 @@ class CeleryTaskTests(TestCase):
 
         self.assertEqual(result["status"], "success")
         self.assertEqual(result["movie_id"], 550)
+
+    def test_analytics_report_invalidated_by_admin_deactivation(self):
+        admin_user = User.objects.create_superuser(username="admin", email="admin@example.com", password="adminpass123")
+        self.client.force_login(admin_user)
+        self.assertEqual(generate_analytics_report()["report"]["active_users"], 2)
+
+        # The bulk action uses queryset.update(), which sends no post_save
+        self.client.post(
+            reverse("admin:auth_user_changelist"),
+            {"action": "deactivate_users", "_selected_action": [self.user.pk]},
+        )
+
+        result = generate_analytics_report()
+        self.assertNotEqual(result.get("cache"), "hit")
+        self.assertEqual(result["report"]["active_users"], 1)
+
+    def test_analytics_report_reused_by_next_scheduled_run(self):
+        generate_analytics_report()
+
+        # The next beat run fires 12 hours later, once the plain dashboard copy has expired
+        later = time.time() + 43200 + 1
+        with patch("django.core.cache.backends.locmem.time.time", return_value=later):
+            self.assertIsNone(cache.get("analytics_report"))
+            result = generate_analytics_report()
+
+        self.assertEqual(result.get("cache"), "hit")
+
+    def test_analytics_report_invalidated_by_user_edit_but_not_login(self):
+        generate_analytics_report()
+        generation = cache.get(ANALYTICS_GENERATION_KEY)
+
+        self.user.save(update_fields=["last_login"])
+        self.assertEqual(cache.get(ANALYTICS_GENERATION_KEY), generation)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(cache.get(ANALYTICS_GENERATION_KEY), generation + 1)
+
+    @patch("movies.tasks.get_redis_connection")
+    def test_cleanup_old_cache_keeps_ttl_less_counter(self, mock_get_redis):
+        counter_key = cache.make_key(ANALYTICS_GENERATION_KEY).encode()
+        redis_conn = MagicMock()
+        redis_conn.scan_iter.return_value = [b"movie_app:3:stale", counter_key, b"movie_app:3:live"]
+        redis_conn.pipeline.return_value.execute.return_value = [-1, 3600]
+        mock_get_redis.return_value = redis_conn
+
+        result = cleanup_old_cache()
+
+        self.assertEqual(result["keys_cleanup"], 1)
+        redis_conn.unlink.assert_called_once_with(b"movie_app:3:stale")
+
+    @patch("movies.tasks.tmdb_service.get_movies_details_bulk")
+    @patch("movies.tasks.group")
+    def test_bulk_cache_popular_movies_fans_out_large_lists(self, mock_group, mock_bulk):
+        movie_ids = list(range(1, 2 * BULK_CACHE_CHUNK_SIZE + 2))
+
+        result = bulk_cache_popular_movies(movie_ids)
+
+        self.assertEqual(result, {"status": "dispatched", "chunks": 3, "total": len(movie_ids)})
+        signatures = list(mock_group.call_args.args[0])
+        self.assertEqual(
+            [sig.args[0] for sig in signatures],
+            [
+                movie_ids[:BULK_CACHE_CHUNK_SIZE],
+                movie_ids[BULK_CACHE_CHUNK_SIZE : 2 * BULK_CACHE_CHUNK_SIZE],
+                movie_ids[2 * BULK_CACHE_CHUNK_SIZE :],
+            ],
+        )
+        mock_group.return_value.apply_async.assert_called_once_with()
+        mock_bulk.assert_not_called()
+
+    @patch("movies.tasks.tmdb_service.get_movies_details_bulk")
+    @patch("movies.tasks.group")
+    def test_bulk_cache_popular_movies_fetches_small_lists_inline(self, mock_group, mock_bulk):
+        mock_bulk.return_value = {550: {"id": 550}}
+
+        result = bulk_cache_popular_movies([550, 551])
+
+        self.assertEqual(result, {"status": "success", "cached": 1, "total": 2})
+        mock_bulk.assert_called_once_with([550, 551])
+        mock_group.assert_not_called()
+
+    @patch("movies.tasks.WEEKLY_RECOMMENDATIONS_CHUNK_SIZE", 2)
+    def test_weekly_recommendations_streams_users_in_chunks(self):
+        # Five users across three chunks; favorites are prefetched per chunk and must stay with their owner
+        users = [self.user] + [
+            User.objects.create_user(username=f"fan{i}", email=f"fan{i}@example.com", password="pass123") for i in range(4)
+        ]
+        for user in users:
+            FavoriteMovie.objects.create(user=user, movie_id=user.pk, title=f"Pick of {user.username}")
+        inactive = User.objects.create_user(username="gone", email="gone@example.com", password="pass123", is_active=False)
+        FavoriteMovie.objects.create(user=inactive, movie_id=999, title="Never sent")
+        User.objects.create_user(username="nofavs", email="nofavs@example.com", password="pass123")
+
+        result = send_weekly_recommendations()
+
+        self.assertEqual(result["emails_sent"], len(users))
+        bodies = {message.to[0]: message.body for message in mail.outbox}
+        self.assertEqual(set(bodies), {user.email for user in users})
+        for user in users:
+            self.assertIn(f"Pick of {user.username}", bodies[user.email])
+            self.assertEqual(bodies[user.email].count("Pick of"), 1)
+
+    def test_weekly_recommendations_lists_five_newest_favorites(self):
+        now = timezone.now()
+        for i in range(7):
+            favorite = FavoriteMovie.objects.create(user=self.user, movie_id=i, title=f"Movie {i}")
+            # added_at is auto_now_add, so backdate after creation: Movie 6 is the newest
+            FavoriteMovie.objects.filter(pk=favorite.pk).update(added_at=now - timedelta(days=7 - i))
+
+        send_weekly_recommendations()
+
+        self.assertEqual(len(mail.outbox), 1)
+        lines = [line for line in mail.outbox[0].body.splitlines() if line.startswith("- ")]
+        self.assertEqual([line.split(" (")[0] for line in lines], [f"- Movie {i}" for i in (6, 5, 4, 3, 2)])
+
+    @patch("movies.tasks.get_connection", wraps=get_connection)
+    def test_weekly_recommendations_reuse_one_mail_connection(self, mock_get_connection):
+        other = User.objects.create_user(username="other", email="other@example.com", password="pass123")
+        FavoriteMovie.objects.create(user=self.user, movie_id=550, title="Fight Club")
+        FavoriteMovie.objects.create(user=other, movie_id=551, title="Contact")
+
+        result = send_weekly_recommendations()
+
+        self.assertEqual(result["emails_sent"], 2)
+        self.assertEqual(len(mail.outbox), 2)
+        mock_get_connection.assert_called_once_with()
+
+    @patch("movies.tasks.CLEANUP_BATCH_SIZE", 2)
+    @patch("movies.tasks.get_redis_connection")
+    def test_cleanup_old_cache_checks_ttls_and_unlinks_per_batch(self, mock_get_redis):
+        redis_conn = MagicMock()
+        redis_conn.scan_iter.return_value = [
+            b"movie_app:3:a",
+            b"movie_app:3:b",
+            b"movie_app:3:c",
+            b"movie_app:3:d",
+            b"movie_app:3:e",
+        ]
+        # TTL -1: no expiry, -2: already gone, positive: still live
+        redis_conn.pipeline.return_value.execute.side_effect = [[-1, 60], [-2, -1], [120]]
+        mock_get_redis.return_value = redis_conn
+
+        result = cleanup_old_cache()
+
+        self.assertEqual(result["keys_cleanup"], 3)
+        redis_conn.scan_iter.assert_called_once_with(match="movie_app:*", count=1000)
+        self.assertEqual(redis_conn.pipeline.return_value.execute.call_count, 3)
+        self.assertEqual(redis_conn.unlink.call_args_list, [call(b"movie_app:3:a"), call(b"movie_app:3:c", b"movie_app:3:d")])
+        redis_conn.delete.assert_not_called()
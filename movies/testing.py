@@ -0,0 +1,9 @@
+def locmem_caches(location):
+    """Cache settings giving a test class its own in-process cache instead of the shared Redis"""
+    return {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": location,
+            "KEY_PREFIX": "movie_app",
+        }
+    }
@@ -1,46 +1,160 @@
-import json
+import hashlib
 import logging
-from datetime import datetime
+import os
+import random
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import orjson
 import requests
 from django.conf import settings
 from django.core.cache import cache
 from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# Retry transient TMDb failures (rate limiting, 5xx) on the pooled connection with backoff;
+# the final response is returned so raise_for_status() still surfaces the HTTP error
+TMDB_RETRY = Retry(
+    total=3,
+    backoff_factor=0.3,
+    status_forcelist=[429, 500, 502, 503, 504],
+    raise_on_status=False,
+)
+
+# Dogpile protection for cold cache keys: lock lifetime, and how long other workers wait for the refill
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 2.0
+CACHE_LOCK_POLL_INTERVAL = 0.1
+
+# Delete the refill lock only if it still holds our token, atomically on the Redis side
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Concurrent TMDb requests per bulk fetch; stays below the session's connection pool size
+BULK_FETCH_MAX_WORKERS = 8
+
+# Cache policy per content class: (base TTL, max random jitter, extend TTL on hit)
+# Jitter keeps keys written together from expiring in lockstep; only slow-changing
+# movie details are kept warm on read, trending/recommendations must still refresh
+_CACHE_POLICY = {
+    "trending": (3600, 300, False),
+    "recommended": (7200, 600, False),
+    "search": (120, 30, False),
+    "details": (86400, 3600, True),
+}
+
+
+# Fields kept from TMDb payloads before caching; the rest (production companies, spoken
+# languages, collections, ...) is never read and only bloats Redis entries
+_RESULT_FIELDS = frozenset(
+    ["id", "title", "overview", "poster_path", "backdrop_path", "release_date", "vote_average", "vote_count", "popularity"]
+)
+_DETAIL_FIELDS = _RESULT_FIELDS | {"genres", "runtime", "tagline", "status", "imdb_id"}
+
+
+def _project_results(data):
+    """Trim each movie in a paginated TMDb list response to the fields the API serves"""
+    return {**data, "results": [{k: v for k, v in movie.items() if k in _RESULT_FIELDS} for movie in data.get("results", [])]}
+
+
+def _project_details(data):
+    """Trim a TMDb movie details response to the fields the API serves"""
+    return {k: v for k, v in data.items() if k in _DETAIL_FIELDS}
+
+
+def cache_ttl(policy):
+    """Return the jittered TTL to store a fresh value under for the given cache policy"""
+    ttl, jitter, _ = _CACHE_POLICY[policy]
+    return ttl + random.randint(0, jitter)
+
 
 class TMDbService:
     """
     Service class for interacting with The Movie Database (TMDb) API
     """
 
+    # Keep-alive session shared by every instance in the process, created on first use
+    _session = None
+    _session_lock = threading.Lock()
+
     def __init__(self):
         self.api_key = settings.TMDB_API_KEY
         self.base_url = settings.TMDB_BASE_URL
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json;charset=utf-8",
-        }
+        # Endpoint URLs are built once here rather than on every request
+        self.trending_url = f"{self.base_url}/trending/movie/week"
+        self.search_url = f"{self.base_url}/search/movie"
+        self.movie_url = f"{self.base_url}/movie/%s"
+        self.recommendations_url = f"{self.base_url}/movie/%s/recommendations"
+        # v4 read access tokens (JWTs) authenticate via the Bearer header alone;
+        # legacy v3 keys are only accepted as the api_key query parameter
+        self.auth_params = {} if self.api_key.startswith("eyJ") else {"api_key": self.api_key}
+        self._redis = None
 
-    def _make_request(self, endpoint, params=None):
+    @property
+    def redis(self):
+        """Raw redis-py client for the default cache, looked up once and reused (it wraps the shared pool)"""
+        if self._redis is None:
+            self._redis = get_redis_connection("default")
+        return self._redis
+
+    @classmethod
+    def _get_session(cls):
+        """
+        Return the process-wide requests.Session, building it once under a lock
+        The auth headers are set here once rather than passed per request;
+        urllib3's pool hands out connections to concurrent threads safely
+        """
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    session = requests.Session()
+                    session.headers.update(
+                        {
+                            "Authorization": f"Bearer {settings.TMDB_API_KEY}",
+                            "Content-Type": "application/json;charset=utf-8",
+                        }
+                    )
+                    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=TMDB_RETRY))
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def _reset_session(cls):
+        """
+        Drop the inherited session in a forked child (gunicorn --preload, Celery prefork)
+        so each process opens its own sockets instead of sharing the parent's
+        """
+        cls._session = None
+        cls._session_lock = threading.Lock()
+
+    def _make_request(self, url, params=None):
         """
         Make HTTP request to TMDb API with error handling
         """
         try:
-            url = f"{self.base_url}/{endpoint}"
-            params = params or {}
-            params["api_key"] = self.api_key
+            if self.auth_params:
+                params = {**(params or {}), **self.auth_params}
 
-            logger.info("Making TMDb API request to: %s", endpoint)
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
+            logger.info("Making TMDb API request to: %s", url)
+            response = self._get_session().get(url, params=params, timeout=10)
             response.raise_for_status()
             logger.info(
                 "TMDb API request successful: %s - Status: %s",
-                endpoint,
+                url,
                 response.status_code,
             )
-            return response.json()
+            # orjson parses the multi-KB payloads in native code, several times faster than stdlib json
+            return orjson.loads(response.content)
         except requests.exceptions.HTTPError as e:
             logger.error("HTTP error while fetching TMDb data: %s", e)
             raise
@@ -50,141 +164,178 @@ class TMDbService:
         except requests.exceptions.ConnectionError as e:
             logger.error("Connection error: %s", e)
             raise
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error("Invalid JSON response from TMDb: %s", e)
             raise ValueError("TMDb returned invalid JSON") from e
         except requests.exceptions.RequestException as e:
             logger.error("Unexpected TMDb request failure: %s", e)
             raise RuntimeError("Failed to fetch data from TMDb") from e
 
-    def get_trending_movies(self, page=1):
+    def _cached_request(self, policy, cache_key, url, params=None, project=_project_results):
         """
-        Fetch trending movies with Redis caching
-        Cache Key: trending_movies_{page}
-        Cache Timeout: 1 hour
+        Return cached TMDb data for cache_key, fetching and trimming it with project() on a miss
+        A short cache.add() (SET NX) lock lets one worker refill a cold key while others wait for it
         """
-        cache_key = f"trending_movies_{page}"
-        cached_data = cache.get(cache_key)
+        ttl, _, touch_on_hit = _CACHE_POLICY[policy]
 
-        if cached_data:
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            if touch_on_hit:
+                cache.touch(cache_key, ttl)
             logger.info(
-                "✓ CACHE HIT: %s | Retrieved from Redis cache | Time: %s",
+                "✓ CACHE HIT: %s | Retrieved from Redis cache",
                 cache_key,
-                datetime.now().isoformat(),
             )
             return cached_data
 
+        # Single-flight: only the worker holding the SET NX lock fetches from TMDb
+        lock_key = f"{cache_key}:lock"
+        # An int token is stored raw by django-redis (not serialized/compressed), so the release script can compare it
+        lock_token = secrets.randbits(63)
+        acquired = cache.add(lock_key, lock_token, CACHE_LOCK_TIMEOUT)
+        if acquired:
+            # The previous holder may have filled the key between our miss and the lock
+            cached_data = cache.get(cache_key)
+            if cached_data is not None:
+                self._release_lock(lock_key, lock_token)
+                return cached_data
+        elif acquired is False:
+            # Another worker is already fetching this key; wait briefly for its result.
+            # None means Redis is down (IGNORE_EXCEPTIONS), so nobody can refill it: fetch right away
+            deadline = time.monotonic() + CACHE_LOCK_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(CACHE_LOCK_POLL_INTERVAL)
+                cached_data = cache.get(cache_key)
+                if cached_data is not None:
+                    return cached_data
+
         logger.info(
-            "✗ CACHE MISSED: %s | Fetching from TMDb API | Time: %s",
+            "✗ CACHE MISSED: %s | Fetching from TMDb API",
             cache_key,
-            datetime.now().isoformat(),
         )
-        data = self._make_request("trending/movie/week", {"page": page})
+        ttl = cache_ttl(policy)
+        try:
+            data = project(self._make_request(url, params))
+            # SET NX: a waiter that gave up and fetched concurrently may already have filled the key
+            cache.add(cache_key, data, ttl)
+        finally:
+            if acquired:
+                self._release_lock(lock_key, lock_token)
 
-        # Cache for 1 hour
-        cache.set(cache_key, data, 3600)
         logger.info(
-            "✓ CACHE SET: %s | Stored in Redis with TTL=3600s | Items: %s | Time: %s",
+            "✓ CACHE SET: %s | Stored in Redis with TTL=%ss",
             cache_key,
-            len(data.get("results", [])),
-            datetime.now().isoformat(),
+            ttl,
         )
         return data
 
+    def _release_lock(self, lock_key, lock_token):
+        """Delete the refill lock only if this worker still owns it (it may have expired and been re-taken)"""
+        try:
+            redis_conn = self.redis
+        except NotImplementedError:
+            # Non-Redis cache backends (LocMemCache in tests) have no scripting; compare and delete directly
+            if cache.get(lock_key) == lock_token:
+                cache.delete(lock_key)
+            return
+
+        try:
+            redis_conn.eval(_RELEASE_LOCK_SCRIPT, 1, cache.make_key(lock_key), lock_token)
+        except RedisError as e:
+            # The lock expires on its own after CACHE_LOCK_TIMEOUT
+            logger.warning("Failed to release cache lock %s: %s", lock_key, e)
+
+    def get_trending_movies(self, page=1):
+        """
+        Fetch trending movies with Redis caching
+        Cache Key: trending_movies_{page}
+        Cache Timeout: 1 hour
+        """
+        return self._cached_request("trending", f"trending_movies_{page}", self.trending_url, {"page": page})
+
+    def fetch_trending_movies(self, page=1):
+        """
+        Fetch a trending page straight from TMDb, bypassing the cache
+        Used by the periodic refresh, which overwrites trending_movies_{page} itself
+        """
+        return _project_results(self._make_request(self.trending_url, {"page": page}))
+
     def get_recommended_movies(self, movie_id):
         """
         Fetch movie recommendations with Redis caching
         Cache Key: recommended_movies_{movie_id}
         Cache Timeout: 2 hours
         """
-        cache_key = f"recommended_movies_{movie_id}"
-        cached_data = cache.get(cache_key)
-
-        if cached_data:
-            logger.info(
-                "✓ CACHE HIT: %s | Retrieved from Redis cache | Time: %s",
-                cache_key,
-                datetime.now().isoformat(),
-            )
-            return cached_data
-
-        logger.info(
-            "✗ CACHE MISSED: %s | Fetching from TMDb API | Time: %s",
-            cache_key,
-            datetime.now().isoformat(),
-        )
-        data = self._make_request(f"movie/{movie_id}/recommendations")
-
-        # Cache for 2 hours
-        cache.set(cache_key, data, 7200)
-        logger.info(
-            "✓ CACHE SET: %s | Stored in Redis with TTL=7200s | Items: %s | Time: %s",
-            cache_key,
-            len(data.get("results", [])),
-            datetime.now().isoformat(),
-        )
-        return data
+        return self._cached_request("recommended", f"recommended_movies_{movie_id}", self.recommendations_url % movie_id)
 
     def search_movies(self, query, page=1):
         """
-        Search for movies by query
+        Search for movies by query with a short micro-cache
+        Cache Key: search_{blake2b(normalized query)}_{page}
+        Cache Timeout: 2 minutes (absorbs repeated autocomplete/pagination hits)
         """
-
         logger.info(
-            "SEARCH REQUEST: query='%s' page=%s | Time: %s",
+            "SEARCH REQUEST: query='%s' page=%s",
             query,
             page,
-            datetime.now().isoformat(),
         )
-        data = self._make_request("search/movie", {"query": query, "page": page})
-        logger.info(
-            "SEARCH COMPLETED: query='%s' | Results: %s | Time: %s",
-            query,
-            len(data.get("results", [])),
-            datetime.now().isoformat(),
-        )
-        return data
+        # Hash the query so arbitrary user input yields a short, Redis-safe key
+        query_hash = hashlib.blake2b(query.strip().lower().encode(), digest_size=8).hexdigest()
+        return self._cached_request("search", f"search_{query_hash}_{page}", self.search_url, {"query": query, "page": page})
 
     def get_movie_details(self, movie_id):
         """
         Get detailed information about a specific movie with caching
+        Cache Timeout: 24 hours (movie details rarely change)
         """
-        cache_key = f"movie_details_{movie_id}"
-        cached_data = cache.get(cache_key)
+        return self._cached_request(
+            "details", f"movie_details_{movie_id}", self.movie_url % movie_id, project=_project_details
+        )
 
-        if cached_data:
-            logger.info(
-                "✓ CACHE HIT: %s | Retrieved from Redis cache | Time: %s",
-                cache_key,
-                datetime.now().isoformat(),
-            )
-            return cached_data
+    def prefetch_movie_bundle(self, movie_id):
+        """
+        Fetch a movie's details and recommendations concurrently
+        Both requests share the pooled session, so a cold cache costs one round trip instead of two
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            details = executor.submit(self.get_movie_details, movie_id)
+            recommendations = executor.submit(self.get_recommended_movies, movie_id)
+        return {"details": details.result(), "recommendations": recommendations.result()}
 
-        logger.info(
-            "✗ CACHE MISSED: %s | Fetching from TMDb API | Time: %s",
-            cache_key,
-            datetime.now().isoformat(),
-        )
-        data = self._make_request(f"movie/{movie_id}")
+    def get_movies_details_bulk(self, movie_ids):
+        """
+        Get details for many movies with one MGET for the cached ones, concurrent TMDb
+        fetches for the rest and one MSET to store them
+        Returns a {movie_id: details} dict; movies that failed to fetch are logged and left out
+        """
+        keys = {movie_id: f"movie_details_{movie_id}" for movie_id in movie_ids}
+        cached = cache.get_many(list(keys.values()))
+        details = {movie_id: cached[key] for movie_id, key in keys.items() if key in cached}
+        missing_ids = [movie_id for movie_id in keys if movie_id not in details]
+        if not missing_ids:
+            return details
 
-        # Cache for 24 hours (movie details rarely change)
-        cache.set(cache_key, data, 86400)
-        logger.info(
-            "✓ CACHE SET: %s | Stored in Redis with TTL=86400s | Title: %s | Time: %s",
-            cache_key,
-            data.get("title", "N/A"),
-            datetime.now().isoformat(),
-        )
-        return data
+        with ThreadPoolExecutor(max_workers=min(BULK_FETCH_MAX_WORKERS, len(missing_ids))) as executor:
+            futures = {movie_id: executor.submit(self._make_request, self.movie_url % movie_id) for movie_id in missing_ids}
+
+        fetched = {}
+        for movie_id, future in futures.items():
+            try:
+                fetched[movie_id] = _project_details(future.result())
+            except Exception as e:
+                logger.error("Error fetching details for movie %s: %s", movie_id, e)
+
+        if fetched:
+            cache.set_many({keys[movie_id]: data for movie_id, data in fetched.items()}, cache_ttl("details"))
+        details.update(fetched)
+        return details
 
     def get_cache_stats(self):
         """
         Get cache statistics (useful for monitoring)
         """
         try:
-            redis_conn = get_redis_connection("default")
-
-            info = redis_conn.info("stats")
+            info = self.redis.info("stats")
             stats = {
                 "total_commands": info.get("total_commands_processed", 0),
                 "keyspace_hits": info.get("keyspace_hits", 0),
@@ -206,3 +357,9 @@ class TMDbService:
         except Exception as e:
             logger.error("Failed to get cache stats: %s", e)
             return None
+
+
+os.register_at_fork(after_in_child=TMDbService._reset_session)
+
+# Cheap to build: the HTTP session is created lazily on the first request in each process
+tmdb_service = TMDbService()
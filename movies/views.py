@@ -1,9 +1,13 @@
 import logging
+from functools import partial
 
+from django.conf import settings
+from django.db import transaction
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
@@ -12,10 +16,28 @@ from rest_framework.response import Response
 from .models import FavoriteMovie
 from .serializers import AddFavoriteSerializer, FavoriteMovieSerializer, MovieSerializer
 from .tasks import fetch_movie_details_async, send_favorite_notification
-from .utils.tmdb_service import TMDbService
+from .utils.tmdb_service import tmdb_service
 
 logger = logging.getLogger(__name__)
-tmdb_service = TMDbService()
+
+# TMDb rejects list/search pages beyond 500
+TMDB_MAX_PAGE = 500
+
+
+def _parse_page(value, default=1):
+    """
+    Coerce the ?page= query param to an int in TMDb's range
+    Normalizing here keeps "2", "02" and " 2" on one cache key; anything else is a 400
+    """
+    if value is None:
+        return default
+    try:
+        page = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({"page": "Page must be an integer."})
+    if not 1 <= page <= TMDB_MAX_PAGE:
+        raise ValidationError({"page": f"Page must be between 1 and {TMDB_MAX_PAGE}."})
+    return page
 
 
 @swagger_auto_schema(
@@ -37,8 +59,8 @@ def trending_movies(request):
     """
     Get trending movies (cached for 1 hour)
     """
+    page = _parse_page(request.query_params.get("page"))
     try:
-        page = request.query_params.get("page", 1)
         logger.info(
             "API REQUEST: /api/movies/trending/ | page=%s | user=%s",
             page,
@@ -161,15 +183,15 @@ def search_movies(request):
     """
     Search for movies by title
     """
-    try:
-        query = request.query_params.get("query")
-        if not query:
-            return Response(
-                {"error": "Query parameter is required"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+    query = request.query_params.get("query")
+    if not query:
+        return Response(
+            {"error": "Query parameter is required"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
-        page = request.query_params.get("page", 1)
+    page = _parse_page(request.query_params.get("page"))
+    try:
         data = tmdb_service.search_movies(query, page=page)
         return Response(data, status=status.HTTP_200_OK)
     except Exception as e:
@@ -215,6 +237,12 @@ def movie_details(request, movie_id):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _enqueue_favorite_tasks(user_id, movie_id, movie_title):
+    """Send the favorite notification and fetch the movie's full details in the background"""
+    send_favorite_notification.delay(user_id=user_id, movie_title=movie_title)
+    fetch_movie_details_async.delay(movie_id)
+
+
 class FavoriteMovieListView(generics.ListAPIView):
     """
     Get list of user's favorite movies
@@ -237,7 +265,7 @@ class AddFavoriteView(generics.GenericAPIView):
 
     serializer_class = AddFavoriteSerializer
     permission_classes = [IsAuthenticated]
-    renderer_classes = [JSONRenderer, BrowsableAPIRenderer]
+    renderer_classes = [JSONRenderer] + ([BrowsableAPIRenderer] if settings.DEBUG else [])
 
     @swagger_auto_schema(
         operation_description="Display form for adding a favorite movie.",
@@ -262,30 +290,31 @@ class AddFavoriteView(generics.GenericAPIView):
         serializer.is_valid(raise_exception=True)
         validated_data = serializer.validated_data
 
-        # Check if the movie already exists in favorites
-        existing = FavoriteMovie.objects.filter(user=request.user, movie_id=validated_data["movie_id"]).first()
+        # Look up and create in one step; the (user, movie_id) unique constraint
+        # makes concurrent duplicate posts resolve to the existing row
+        favorite, created = FavoriteMovie.objects.get_or_create(
+            user=request.user,
+            movie_id=validated_data["movie_id"],
+            defaults={key: value for key, value in validated_data.items() if key != "movie_id"},
+        )
 
-        if existing:
+        if not created:
             return Response(
                 {"error": "Movie already in favorites"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Create a new favorite entry
-        favorite = FavoriteMovie.objects.create(
-            user=request.user,
-            **validated_data,
-        )
-
-        # Send notification asynchronously
-        send_favorite_notification.delay(
-            user_id=request.user.id,
-            movie_title=validated_data["title"],
+        # Enqueue the follow-up tasks only once the favorite is committed, so a rolled-back
+        # insert never sends a notification or warms the cache for a row that doesn't exist
+        transaction.on_commit(
+            partial(
+                _enqueue_favorite_tasks,
+                user_id=request.user.id,
+                movie_id=validated_data["movie_id"],
+                movie_title=validated_data["title"],
+            )
         )
 
-        # Fetch and cache full movie details asynchronously
-        fetch_movie_details_async.delay(validated_data["movie_id"])
-
         logger.info(
             "User %s added movie %s to favorites",
             request.user.username,
@@ -317,26 +346,16 @@ def remove_favorite(request, movie_id):
     """
     Remove a movie from user's favorites
     """
-    try:
-        logger.info(
-            "API REQUEST: /api/movies/favorites/remove/%s/ | user=%s",
-            movie_id,
-            request.user.username,
-        )
+    logger.info(
+        "API REQUEST: /api/movies/favorites/remove/%s/ | user=%s",
+        movie_id,
+        request.user.username,
+    )
 
-        favorite = FavoriteMovie.objects.get(user=request.user, movie_id=movie_id)
-        favorite.delete()
+    # Delete by filter and branch on the affected row count instead of get() + delete()
+    deleted, _ = FavoriteMovie.objects.filter(user=request.user, movie_id=movie_id).delete()
 
-        logger.info(
-            "API RESPONSE: /api/movies/favorites/remove/%s/ | status=204 | user=%s",
-            movie_id,
-            request.user.username,
-        )
-        return Response(
-            {"message": "Movie removed from favorites"},
-            status=status.HTTP_204_NO_CONTENT,
-        )
-    except FavoriteMovie.DoesNotExist:
+    if not deleted:
         logger.warning(
             "API WARNING: /api/movies/favorites/remove/%s/ | status=404 | user=%s | error=Not in favorites",
             movie_id,
@@ -344,6 +363,16 @@ def remove_favorite(request, movie_id):
         )
         return Response({"error": "Movie not found in favorites"}, status=status.HTTP_404_NOT_FOUND)
 
+    logger.info(
+        "API RESPONSE: /api/movies/favorites/remove/%s/ | status=204 | user=%s",
+        movie_id,
+        request.user.username,
+    )
+    return Response(
+        {"message": "Movie removed from favorites"},
+        status=status.HTTP_204_NO_CONTENT,
+    )
+
 
 @swagger_auto_schema(
     method="get",
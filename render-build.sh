@@ -9,6 +9,9 @@ pip install --upgrade pip
 # Install dependencies
 pip install -r requirements.txt
 
+# Create the log directory up front so app processes don't have to
+mkdir -p logs
+
 # Apply any outstanding database migrations
 python manage.py migrate --noinput
 
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from users.models import UserProfile
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    """Create missing profiles for users created outside registration"""
+
+    help = "Create a UserProfile for every user that doesn't have one"
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        missing = User.objects.filter(profile__isnull=True).order_by("pk").values_list("pk", flat=True)
+        before = missing.count()
+
+        # Walk user ids in pk order one batch at a time, so memory stays bounded and each batch is one multi-row INSERT
+        last_pk = 0
+        while batch := list(missing.filter(pk__gt=last_pk)[:BATCH_SIZE]):
+            UserProfile.objects.bulk_create([UserProfile(user_id=pk) for pk in batch], ignore_conflicts=True)
+            last_pk = batch[-1]
+
+        # Re-count rather than trust bulk_create's return value, which includes rows ignore_conflicts skipped
+        created = before - missing.count()
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {created} missing profile(s)."))
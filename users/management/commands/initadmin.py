@@ -1,6 +1,7 @@
 from decouple import config
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
 
 
 class Command(BaseCommand):
@@ -14,8 +15,16 @@ class Command(BaseCommand):
         email = config("DJANGO_SUPERUSER_EMAIL")
         password = config("DJANGO_SUPERUSER_PASSWORD")
 
-        if not User.objects.filter(username=username).exists():
-            User.objects.create_superuser(username, email, password)
-            self.stdout.write(self.style.SUCCESS(f"Superuser '{username}' created successfully!"))
-        else:
+        if User.objects.filter(username=username).exists():
             self.stdout.write(self.style.WARNING(f"Superuser '{username}' already exists. Skipping creation."))
+            return
+
+        # Parallel deploys can race past the check; the unique username constraint decides the winner
+        try:
+            with transaction.atomic():
+                User.objects.create_superuser(username, email, password)
+        except IntegrityError:
+            self.stdout.write(self.style.WARNING(f"Superuser '{username}' already exists. Skipping creation."))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Superuser '{username}' created successfully!"))
@@ -1,15 +1,23 @@
+from io import StringIO
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from movies.testing import locmem_caches
+
 from .models import UserProfile
 
 User = get_user_model()
 
 
 # bandit: skip=B105,B106
+@override_settings(CACHES=locmem_caches("users-registration-tests"))
 class UserRegistrationTests(APITestCase):
     """
     Test suite for user registration
@@ -154,6 +162,7 @@ class UserRegistrationTests(APITestCase):
         self.assertEqual(user.last_name, "")
 
 
+@override_settings(CACHES=locmem_caches("users-login-tests"))
 class UserLoginTests(APITestCase):
     """
     Test suite for user login and authentication
@@ -244,6 +253,7 @@ class UserLoginTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+@override_settings(CACHES=locmem_caches("users-jwt-tests"))
 class JWTTokenTests(APITestCase):
     """
     Test suite for JWT token generation and validation
@@ -331,6 +341,7 @@ class JWTTokenTests(APITestCase):
         self.assertEqual(int(refresh["user_id"]), self.user.id)
 
 
+@override_settings(CACHES=locmem_caches("users-profile-tests"))
 class UserProfileTests(APITestCase):
     """
     Test suite for user profile management
@@ -433,7 +444,24 @@ class UserProfileTests(APITestCase):
         # Verify profile was also deleted
         self.assertFalse(UserProfile.objects.filter(id=profile_id).exists())
 
+    def test_backfill_profiles_command(self):
+        """Test that backfill_profiles creates profiles only for users missing one"""
+        users = [
+            User.objects.create_user(username=f"noprofile{i}", email=f"noprofile{i}@example.com", password="pass123")
+            for i in range(3)
+        ]
+        out = StringIO()
+
+        # A batch size smaller than the number of missing profiles exercises the batching loop
+        with patch("users.management.commands.backfill_profiles.BATCH_SIZE", 2):
+            call_command("backfill_profiles", stdout=out)
+
+        self.assertEqual(UserProfile.objects.filter(user__in=users).count(), 3)
+        self.assertEqual(UserProfile.objects.filter(user=self.user).count(), 1)
+        self.assertIn("Backfilled 3 missing profile(s).", out.getvalue())
+
 
+@override_settings(CACHES=locmem_caches("users-auth-flow-tests"))
 class AuthenticationFlowTests(APITestCase):
     """
     Test suite for complete authentication flows